@@ -1,95 +1,113 @@
+import io
+
+import numpy as np
 import pandas as pd
 import streamlit as st
 
+# copy-on-write é sempre ativo a partir do pandas 3, onde a opção está obsoleta
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.options.mode.copy_on_write = True
+
+# =========================
+# ESTRUTURA ALVO DA CARTEIRA
+# =========================
+# ticker -> (categoria, rótulo no sidebar, peso padrão)
+_ATIVOS = {
+    'B5P211': ('Renda Fixa', "B5P211", 0.30),
+    'IB5M11': ('Renda Fixa', "IB5M11", 0.10),
+    'DIVO11': ('Ações', "DIVO11", 0.075),
+    'charles-river-fia': ('Ações', "Charles River", 0.075),
+    'guepardo-institucional-fic-fia': ('Ações', "Guepardo", 0.075),
+    'real-investor-fia-bdr-nivel-i': ('Ações', "Real Investor", 0.075),
+    'IVVB11': ('Exterior', "IVVB11", 0.15),
+    'WRLD11': ('Exterior', "WRLD11", 0.15),
+}
+_SUBCATS = tuple(_ATIVOS)
+_CATEGORIAS = tuple(categoria for categoria, _, _ in _ATIVOS.values())
+_BASE = pd.DataFrame({
+    'Categoria': pd.Categorical(_CATEGORIAS, categories=['Renda Fixa', 'Ações', 'Exterior']),
+    'Subcategoria': pd.Categorical(_SUBCATS, categories=_SUBCATS)
+})
+
+
 # =========================
 # CLASSE DE REBALANCEAMENTO
 # =========================
 class PortfolioRebalancer:
-    def __init__(self, df, pesos, aporte_mensal=2500):
+    def __init__(self, data, pesos, aporte_mensal=2500):
         self.aporte_mensal = aporte_mensal
         self.pesos = pesos
-        self.raw_df = df.copy()
-        self.initialize_data()
+        self.initialize_data(data)
+        self._cols = frozenset(self.data.columns)
         self.calculate_metrics()
 
-    def initialize_data(self):
-        rename_map = {
-            'ATIVO': 'Subcategoria',
-            'PATRIMÔNIO ATUAL': 'Patrimônio Atual',
-            'RENTABILIDADE': 'Rentabilidade',
-            'RESULTADO': 'Resultado',
-            'PREÇO MÉDIO': 'Preco Medio',
-            'PREÇO ATUAL': 'Preco Atual',
-            'QUANTIDADE': 'Quantidade'
-        }
-        self.raw_df = self.raw_df.rename(
-            columns={k: v for k, v in rename_map.items() if k in self.raw_df.columns}
+    def initialize_data(self, data):
+        alvo = np.fromiter(
+            (self.pesos[k] for k in data['Subcategoria']), dtype=np.float64, count=len(data)
         )
-
-        base = pd.DataFrame({
-            'Categoria': [
-                'Renda Fixa','Renda Fixa',
-                'Ações','Ações','Ações','Ações',
-                'Exterior','Exterior'
-            ],
-            'Subcategoria': list(self.pesos.keys()),
-            '% Alvo Subcat': list(self.pesos.values())
-        })
-
-        self.data = base.merge(self.raw_df, on='Subcategoria', how='left')
-        self.data['Patrimônio Atual'] = self.data['Patrimônio Atual'].fillna(0)
+        self.data = data.assign(**{'% Alvo Subcat': alvo})
 
     def calculate_metrics(self):
-        total = self.data['Patrimônio Atual'].sum()
-        self.data['% Atual'] = self.data['Patrimônio Atual'] / total
-        self.data['Gap'] = ((total + self.aporte_mensal) * self.data['% Alvo Subcat'] -
-                            self.data['Patrimônio Atual'])
-
-        positivos = self.data[self.data['Gap'] > 0]['Gap']
-        if not positivos.empty:
-            soma = positivos.sum()
-            self.data['Aporte'] = self.data.apply(
-                lambda r: r['Gap'] / soma * self.aporte_mensal if r['Gap'] > 0 else 0,
-                axis=1
-            )
+        patrimonio = self.data['Patrimônio Atual'].to_numpy(dtype=np.float64)
+        total = patrimonio.sum()
+        self.total_patrimonio = total
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.data['% Atual'] = patrimonio / total
+        gap = self.data['% Alvo Subcat'].to_numpy(dtype=np.float64) * (total + self.aporte_mensal)
+        gap -= patrimonio
+        self.data['Gap'] = gap
+
+        if 'Resultado' in self._cols:
+            self.resultado_total = np.nansum(self.data['Resultado'].to_numpy(dtype=np.float64))
+
+        pos_mask = gap > 0
+        soma = gap[pos_mask].sum()
+        if soma:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                self.data['Aporte'] = np.where(pos_mask, gap / soma * self.aporte_mensal, 0.0)
         else:
-            self.data['Aporte'] = 0
+            self.data['Aporte'] = 0.0
 
     # =========================
     # MÉTRICAS REAIS
     # =========================
     def resumo(self):
+        pct_atual = self.data['% Atual'].to_numpy(dtype=np.float64)
+
         cols = st.columns(5)
         cols[0].metric("Aporte Mensal", f"R$ {self.aporte_mensal:,.2f}")
-        cols[1].metric("Patrimônio Atual", f"R$ {self.data['Patrimônio Atual'].sum():,.2f}")
+        cols[1].metric("Patrimônio Atual", f"R$ {self.total_patrimonio:,.2f}")
 
-        if 'Resultado' in self.data:
-            cols[2].metric("Resultado Total", f"R$ {self.data['Resultado'].sum():,.2f}")
+        if 'Resultado' in self._cols:
+            cols[2].metric("Resultado Total", f"R$ {self.resultado_total:,.2f}")
 
-        if 'Rentabilidade' in self.data:
-            rent_med = (self.data['Rentabilidade'] * self.data['% Atual']).sum()
+        if 'Rentabilidade' in self._cols:
+            rent = self.data['Rentabilidade'].to_numpy(dtype=np.float64)
+            rent_med = np.nansum(rent * pct_atual)
             cols[3].metric("Rentabilidade Média", f"{rent_med:.2%}")
 
-        top3 = self.data.sort_values('Patrimônio Atual', ascending=False).head(3)
-        cols[4].metric("Top 3 Concentração", f"{top3['% Atual'].sum():.2%}")
+        top3 = np.nansum(np.partition(pct_atual, -3)[-3:])
+        cols[4].metric("Top 3 Concentração", f"{top3:.2%}")
 
     # =========================
     # GRÁFICOS NATIVOS
     # =========================
     def graficos(self):
+        indexed = self.data.set_index('Subcategoria')
+
         st.subheader("Distribuição da Carteira")
-        st.bar_chart(self.data.set_index('Subcategoria')['Patrimônio Atual'])
+        st.bar_chart(indexed['Patrimônio Atual'])
 
         st.subheader("Aporte por Ativo")
-        st.bar_chart(self.data.set_index('Subcategoria')['Aporte'])
+        st.bar_chart(indexed['Aporte'])
 
-        if 'Resultado' in self.data:
+        if 'Resultado' in self._cols:
             st.subheader("Resultado por Ativo (R$)")
-            st.bar_chart(self.data.set_index('Subcategoria')['Resultado'])
+            st.bar_chart(indexed['Resultado'])
 
-        if 'Rentabilidade' in self.data:
+        if 'Rentabilidade' in self._cols:
             st.subheader("Rentabilidade x Peso")
-            st.line_chart(self.data.set_index('Subcategoria')[['% Atual','Rentabilidade']])
+            st.line_chart(indexed[['% Atual','Rentabilidade']])
 
     # =========================
     # TABELA SIMPLES
@@ -98,6 +116,38 @@ class PortfolioRebalancer:
         st.dataframe(self.data)
 
 
+# =========================
+# LEITURA DA PLANILHA
+# =========================
+@st.cache_data(show_spinner=False)
+def _load_portfolio(file_bytes: bytes) -> pd.DataFrame:
+    sheets = pd.read_excel(io.BytesIO(file_bytes), sheet_name=[0, 1], engine="calamine")
+    return pd.concat(sheets.values(), ignore_index=True)
+
+
+@st.cache_data(show_spinner=False)
+def _build_data_frame(file_bytes: bytes) -> pd.DataFrame:
+    raw_df = _load_portfolio(file_bytes)
+    rename_map = {
+        'ATIVO': 'Subcategoria',
+        'PATRIMÔNIO ATUAL': 'Patrimônio Atual',
+        'RENTABILIDADE': 'Rentabilidade',
+        'RESULTADO': 'Resultado',
+        'PREÇO MÉDIO': 'Preco Medio',
+        'PREÇO ATUAL': 'Preco Atual',
+        'QUANTIDADE': 'Quantidade'
+    }
+    raw_df = raw_df.rename(
+        columns={k: v for k, v in rename_map.items() if k in raw_df.columns}
+    )
+
+    base = _BASE.assign(**{'% Alvo Subcat': 0.0})
+    data = base.join(raw_df.set_index('Subcategoria'), on='Subcategoria')
+    patrimonio = data['Patrimônio Atual'].to_numpy(dtype=np.float64, copy=True)
+    data['Patrimônio Atual'] = np.nan_to_num(patrimonio, copy=False, nan=0.0)
+    return data
+
+
 # =========================
 # APP STREAMLIT
 # =========================
@@ -110,30 +160,27 @@ with st.sidebar:
 
     st.markdown("### Pesos (% Alvo)")
     pesos_raw = {
-        'B5P211': st.number_input("B5P211", 0.0, 1.0, 0.30),
-        'IB5M11': st.number_input("IB5M11", 0.0, 1.0, 0.10),
-        'DIVO11': st.number_input("DIVO11", 0.0, 1.0, 0.075),
-        'charles-river-fia': st.number_input("Charles River", 0.0, 1.0, 0.075),
-        'guepardo-institucional-fic-fia': st.number_input("Guepardo", 0.0, 1.0, 0.075),
-        'real-investor-fia-bdr-nivel-i': st.number_input("Real Investor", 0.0, 1.0, 0.075),
-        'IVVB11': st.number_input("IVVB11", 0.0, 1.0, 0.15),
-        'WRLD11': st.number_input("WRLD11", 0.0, 1.0, 0.15),
+        ticker: st.number_input(label, 0.0, 1.0, padrao)
+        for ticker, (_, label, padrao) in _ATIVOS.items()
     }
-    soma = sum(pesos_raw.values())
-    pesos = {k: v / soma for k, v in pesos_raw.items()}
+    vals = np.fromiter(pesos_raw.values(), dtype=np.float64, count=len(pesos_raw))
+    soma = vals.sum()
+    if soma == 0:
+        st.warning("Defina ao menos um peso maior que zero.")
+        st.stop()
+    vals /= soma
+    pesos = dict(zip(pesos_raw, vals))
 
 if arquivo:
-    df0 = pd.read_excel(arquivo, sheet_name=0)
-    df1 = pd.read_excel(arquivo, sheet_name=1)
-    df = pd.concat([df0, df1], ignore_index=True)
-
-    reb = PortfolioRebalancer(df, pesos, aporte)
+    reb = PortfolioRebalancer(_build_data_frame(arquivo.getvalue()), pesos, aporte)
     reb.resumo()
 
-    st.markdown("## Visão Analítica")
-    reb.graficos()
-
-    st.markdown("## Detalhamento")
-    reb.tabela()
+    tab_graficos, tab_tabela = st.tabs(["Visão Analítica", "Detalhamento"])
+    with tab_graficos:
+        if st.checkbox("Exibir gráficos", key="show_graficos"):
+            reb.graficos()
+    with tab_tabela:
+        if st.checkbox("Exibir tabela", key="show_tabela"):
+            reb.tabela()
 else:
     st.info("Envie a planilha para iniciar a análise.")